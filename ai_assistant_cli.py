@@ -1,39 +1,76 @@
 # AI Assistant CLI - Final Project for Beginners
 # This tool demonstrates a menu-driven Python CLI using the Gemini API (via HTTP requests)
-# for Q&A, file processing, and command management.
+# for Q&A, file processing, and command management. Every feature is also available as a
+# scriptable subcommand (run with --help), which skips the menu entirely.
 
-import requests
+import argparse
+import contextlib
 import json
 import os
+import sys
 import time
 import zipfile
 import tarfile
 import base64
+import hashlib
+import threading
 from io import BytesIO
 from uuid import uuid4 # Used for generating unique IDs for recipes
 
 # --- Library Installation and Imports ---
 
-# In environments like Google Colab, we must explicitly install external libraries.
-try:
-    print("Initializing environment and installing necessary libraries...")
-    # Libraries for PDF, DOCX, XLSX, PPTX, and Image handling are installed here.
+# The HTTP and document libraries are slow to import (and the document ones may need installing),
+# so they are only loaded by the features that use them. Searching recipes never touches them.
+
+# Third-party package needed to read each file type. Plain text types need none.
+_DOCUMENT_PACKAGES = {
+    '.pdf': 'PyMuPDF',
+    '.docx': 'python-docx',
+    '.xlsx': 'openpyxl',
+    '.pptx': 'python-pptx',
+    '.jpg': 'Pillow',
+    '.jpeg': 'Pillow',
+    '.png': 'Pillow',
+    '.webp': 'Pillow',
+}
+
+
+def _import_document_library(ext: str):
+    """Imports the library for a file type into the module globals the extraction helpers use."""
+    global fitz, docx, load_workbook, Presentation, Image
+    if ext == '.pdf':
+        import fitz # PyMuPDF for PDF
+    elif ext == '.docx':
+        import docx # python-docx
+    elif ext == '.xlsx':
+        from openpyxl import load_workbook
+    elif ext == '.pptx':
+        from pptx import Presentation # python-pptx
+    else:
+        from PIL import Image
+
+
+def _load_document_library(ext: str):
+    """Imports the library needed to read files with this extension, installing it first if it's missing."""
+    package = _DOCUMENT_PACKAGES.get(ext)
+    if package is None:
+        return
+
+    try:
+        _import_document_library(ext)
+        return
+    except ImportError:
+        pass
+
+    # In environments like Google Colab, we must explicitly install external libraries.
+    print(f"Installing {package} to read {ext} files...")
     # The output is suppressed with '> /dev/null 2>&1' for a cleaner terminal experience.
-    os.system("pip install PyMuPDF python-docx openpyxl python-pptx Pillow > /dev/null 2>&1")
-    print("All file processing libraries installed/verified.")
-except Exception as e:
-    print(f"Could not automatically install libraries: {e}")
-
-# Import third-party libraries after the installation attempt
-try:
-    import fitz # PyMuPDF for PDF
-    import docx # python-docx
-    from openpyxl import load_workbook
-    from pptx import Presentation # python-pptx
-    from PIL import Image
-except ImportError as e:
-    # This warning helps the user debug if installation failed.
-    print(f"FATAL WARNING: One or more required libraries failed to import: {e}. Summarization may fail.")
+    os.system(f"pip install {package} > /dev/null 2>&1")
+    try:
+        _import_document_library(ext)
+    except ImportError as e:
+        # This warning helps the user debug if installation failed.
+        print(f"FATAL WARNING: {package} failed to import: {e}. Summarization may fail.")
 
 
 # --- Configuration ---
@@ -44,18 +81,279 @@ API_KEY = RAW_API_KEY.strip("'\"") # Strip any extra quotes the environment migh
 API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent"
 GROUNDED_MODEL_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent"
 COMMAND_RECIPES_FILE = 'command_recipes.json' # File to store command recipes
+REQUEST_TIMEOUT = 60 # Seconds before an API request is abandoned
+PREFETCH_TOP_N = 3 # How many search results get their AI explanation fetched in the background
+PREFETCH_WORKERS = 3 # Background threads used for speculative prefetching
+PREFETCH_DELAY = 1.5 # Seconds a prefetch waits before sending, so quick picks cancel it before it's billed
+
+# Token budgeting. Estimates are local (about 4 characters per token) and prices are approximate USD
+# per million tokens, so costs shown are a guide rather than an invoice.
+TOKEN_USAGE_FILE = 'token_usage.json' # Persistent per-day, per-feature usage ledger
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258 # Flat cost Gemini charges for an image within the size we send
+MAX_INPUT_TOKENS = 1_000_000 # Model input limit (kept a little under the real 1,048,576)
+SUMMARY_CHUNK_TOKENS = 30_000 # Documents larger than this are summarized in chunks
+MAX_SUMMARY_CHUNKS = 5 # Beyond this many chunks the document is truncated instead
+INPUT_PRICE_PER_MILLION = 0.30
+OUTPUT_PRICE_PER_MILLION = 2.50
+# A daily ceiling of 0 disables budget enforcement. Once it is reached, 'refuse' blocks further
+# requests and 'downgrade' switches to a cheaper model with a capped response length.
+def _parse_daily_token_budget() -> int:
+    """Reads GEMINI_DAILY_TOKEN_BUDGET, falling back to 0 (no budget) if it isn't a whole number."""
+    raw = os.environ.get("GEMINI_DAILY_TOKEN_BUDGET", "").strip()
+    if not raw:
+        return 0
+    try:
+        return max(int(raw), 0)
+    except ValueError:
+        print(f"Warning: GEMINI_DAILY_TOKEN_BUDGET='{raw}' is not a whole number of tokens. "
+              "Daily budget disabled.", file=sys.stderr)
+        return 0
+
+DAILY_TOKEN_BUDGET = _parse_daily_token_budget()
+BUDGET_MODE = os.environ.get("GEMINI_BUDGET_MODE", "refuse").strip().lower()
+DOWNGRADE_MODEL_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-lite:generateContent"
+DOWNGRADE_MAX_OUTPUT_TOKENS = 512
+PREFETCH_BUDGET_SHARE = 0.8 # Speculative prefetches stop once this share of the daily budget is used
+DOWNGRADE_INPUT_PRICE_PER_MILLION = 0.10
+DOWNGRADE_OUTPUT_PRICE_PER_MILLION = 0.40
+
+
+# --- Token Budgeting & Usage Ledger ---
+
+_usage_lock = threading.Lock() # Prefetch threads record usage concurrently with the main thread
+
+
+def _estimate_tokens(text: str) -> int:
+    """Roughly estimates the number of tokens in a piece of text."""
+    return -(-len(text) // CHARS_PER_TOKEN) # Ceiling division
+
+
+def _estimate_payload_tokens(payload, image_data_base64=None) -> int:
+    """Estimates the input tokens of a request payload, including any system instruction and image."""
+    parts = [part for content in payload.get('contents', []) for part in content.get('parts', [])]
+    parts += payload.get('systemInstruction', {}).get('parts', [])
+
+    tokens = IMAGE_TOKENS if image_data_base64 else 0
+    for part in parts:
+        if 'text' in part:
+            tokens += _estimate_tokens(part['text'])
+        elif 'inlineData' in part:
+            tokens += IMAGE_TOKENS
+    return tokens
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text down to roughly max_tokens tokens."""
+    return text[:max_tokens * CHARS_PER_TOKEN]
+
+
+def _split_into_chunks(text: str, chunk_tokens: int, max_chunks=None) -> list:
+    """Splits text into pieces of roughly chunk_tokens tokens, preferring to break on newlines.
+
+    Breaking on newlines makes chunks a little short, so with max_chunks set any leftover tail is
+    merged into the last chunk rather than becoming an extra request.
+    """
+    chunk_chars = chunk_tokens * CHARS_PER_TOKEN
+    chunks = []
+    while len(text) > chunk_chars:
+        cut = text.rfind('\n', 0, chunk_chars)
+        if cut <= 0:
+            cut = chunk_chars
+        chunks.append(text[:cut])
+        text = text[cut:]
+    if text.strip():
+        chunks.append(text)
+    if max_chunks and len(chunks) > max_chunks:
+        chunks[max_chunks - 1:] = ["".join(chunks[max_chunks - 1:])]
+    return chunks
+
+
+def _estimate_cost(prompt_tokens: int, output_tokens: int, downgraded=False) -> float:
+    """Estimates the USD cost of a request from its token counts."""
+    if downgraded:
+        input_price, output_price = DOWNGRADE_INPUT_PRICE_PER_MILLION, DOWNGRADE_OUTPUT_PRICE_PER_MILLION
+    else:
+        input_price, output_price = INPUT_PRICE_PER_MILLION, OUTPUT_PRICE_PER_MILLION
+    return (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def _lock_ledger_file(lock_file):
+    """Takes an exclusive lock on the open lock file. Returns a function that releases it."""
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt # Windows has no fcntl; lock the first byte of the lock file instead
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+
+        def unlock():
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        return unlock
+
+    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+    return lambda: fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def _usage_ledger_lock():
+    """Holds the ledger exclusively against other threads and other running copies of this CLI.
+
+    Yields True once locked, or False (after a warning) if the lock file can't be opened or locked,
+    e.g. when the working directory isn't writable. Callers must then leave the ledger alone.
+    """
+    with _usage_lock:
+        try:
+            lock_file = open(TOKEN_USAGE_FILE + '.lock', 'a+')
+        except OSError as e:
+            print(f"Warning: Can't open token usage lock file: {e}", file=sys.stderr)
+            yield False
+            return
+
+        with lock_file:
+            try:
+                unlock = _lock_ledger_file(lock_file)
+            except OSError as e:
+                print(f"Warning: Can't lock token usage ledger: {e}", file=sys.stderr)
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                unlock()
+
+
+def _load_usage_ledger():
+    """Loads the token usage ledger from the local JSON file. Returns None if it can't be read.
+
+    Call this while holding _usage_ledger_lock().
+    """
+    if not os.path.exists(TOKEN_USAGE_FILE):
+        return {}
+    try:
+        with open(TOKEN_USAGE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading token usage ledger {TOKEN_USAGE_FILE}: {e}", file=sys.stderr)
+        return None
+
+
+def _save_usage_ledger(ledger):
+    """Saves the token usage ledger, replacing the file atomically so readers never see a partial write.
+
+    Call this while holding _usage_ledger_lock().
+    """
+    temp_path = TOKEN_USAGE_FILE + '.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(ledger, f, indent=4)
+        os.replace(temp_path, TOKEN_USAGE_FILE)
+    except Exception as e:
+        print(f"Error saving token usage ledger: {e}", file=sys.stderr)
+
+
+def _tokens_used_today():
+    """Returns the total tokens recorded in the ledger for today, or None if the ledger is unreadable."""
+    with _usage_ledger_lock() as locked:
+        ledger = _load_usage_ledger() if locked else None
+    if ledger is None:
+        return None
+    today = ledger.get(time.strftime('%Y-%m-%d'), {})
+    return sum(entry.get('total_tokens', 0) for entry in today.values())
+
+
+def _record_usage(feature: str, usage_metadata: dict, estimated_tokens: int, downgraded=False):
+    """Adds a request's actual token usage (from the API's usageMetadata) to today's ledger entry."""
+    # Fall back to our own estimate if the API didn't report usage
+    prompt_tokens = usage_metadata.get('promptTokenCount', estimated_tokens)
+    output_tokens = usage_metadata.get('candidatesTokenCount', 0)
+    total_tokens = usage_metadata.get('totalTokenCount', prompt_tokens + output_tokens)
+
+    with _usage_ledger_lock() as locked:
+        ledger = _load_usage_ledger() if locked else None
+        if ledger is None:
+            # Never overwrite a ledger we couldn't read; that would wipe its history.
+            print(f"Warning: Token usage for '{feature}' was not recorded.", file=sys.stderr)
+            return
+
+        entry = ledger.setdefault(time.strftime('%Y-%m-%d'), {}).setdefault(feature, {
+            'requests': 0,
+            'prompt_tokens': 0,
+            'output_tokens': 0,
+            'total_tokens': 0,
+            'estimated_prompt_tokens': 0,
+            'downgraded_requests': 0,
+            'cost_usd': 0.0,
+        })
+        entry['requests'] += 1
+        entry['prompt_tokens'] += prompt_tokens
+        entry['output_tokens'] += output_tokens
+        entry['total_tokens'] += total_tokens
+        entry['estimated_prompt_tokens'] += estimated_tokens
+        entry['downgraded_requests'] += 1 if downgraded else 0
+        entry['cost_usd'] = round(entry['cost_usd'] + _estimate_cost(prompt_tokens, output_tokens, downgraded), 6)
+        _save_usage_ledger(ledger)
+
+
+def _fit_payload_to_limit(payload, estimated_tokens: int, quiet=False) -> int:
+    """Truncates the last text part of an oversized payload in place. Returns the new estimate."""
+    overflow = estimated_tokens - MAX_INPUT_TOKENS
+    if overflow <= 0:
+        return estimated_tokens
+
+    text_parts = [part for part in payload['contents'][-1]['parts'] if 'text' in part]
+    if not text_parts:
+        return estimated_tokens
+
+    last_part = text_parts[-1]
+    keep_tokens = max(_estimate_tokens(last_part['text']) - overflow, 0)
+    last_part['text'] = _truncate_to_tokens(last_part['text'], keep_tokens)
+    if not quiet:
+        print(f"Warning: Request was ~{estimated_tokens} tokens (limit {MAX_INPUT_TOKENS}); input truncated to fit.")
+    return _estimate_payload_tokens(payload)
 
 
 # --- Core API Interaction ---
 
-def _call_gemini_api(payload, is_grounded=False, image_data_base64=None):
-    """Handles the request to the Gemini API with support for image data and exponential backoff."""
+def _call_gemini_api(payload, is_grounded=False, image_data_base64=None, quiet=False, feature='general', cancel_event=None):
+    """Handles the request to the Gemini API with support for image data and exponential backoff.
+
+    Pass quiet=True from background threads so progress messages don't interrupt the user's prompt.
+    Setting cancel_event stops the request before it is sent and before any retry.
+    Token usage is estimated before sending and recorded in the usage ledger under `feature`.
+    """
+    import requests # Imported here so commands that never call the API don't pay for it
 
     if API_KEY == "YOUR_KEY_HERE":
         return "Error: API Key is not set. Please set the GEMINI_API_KEY environment variable.", []
 
     url = GROUNDED_MODEL_URL if is_grounded else API_URL
 
+    # 0. Estimate tokens locally and enforce the input limit and daily budget before sending
+    estimated_tokens = _estimate_payload_tokens(payload, image_data_base64)
+    estimated_tokens = _fit_payload_to_limit(payload, estimated_tokens, quiet=quiet)
+
+    downgraded = False
+    used_tokens = _tokens_used_today() if DAILY_TOKEN_BUDGET else 0
+    if used_tokens is None:
+        return (f"Error: Token usage ledger {TOKEN_USAGE_FILE} is unreadable, so the daily budget can't be "
+                "enforced. Fix or remove the file and try again."), []
+    if DAILY_TOKEN_BUDGET and used_tokens + estimated_tokens > DAILY_TOKEN_BUDGET:
+        if BUDGET_MODE != 'downgrade':
+            return (f"Error: Daily token budget of {DAILY_TOKEN_BUDGET} reached "
+                    f"(this request needs ~{estimated_tokens} tokens). Try again tomorrow or raise GEMINI_DAILY_TOKEN_BUDGET."), []
+        downgraded = True
+        url = DOWNGRADE_MODEL_URL
+        generation_config = dict(payload.get('generationConfig', {}), maxOutputTokens=DOWNGRADE_MAX_OUTPUT_TOKENS)
+        payload = dict(payload, generationConfig=generation_config)
+        if not quiet:
+            print("Warning: Daily token budget reached. Using the cheaper model with a shorter response.")
+
+    if not quiet:
+        print(f"... Estimated input: ~{estimated_tokens} tokens (~${_estimate_cost(estimated_tokens, 0, downgraded):.4f})")
+
     headers = {
         'Content-Type': 'application/json',
         'X-Goog-Api-Key': API_KEY,
@@ -79,14 +377,18 @@ def _call_gemini_api(payload, is_grounded=False, image_data_base64=None):
 
     max_retries = 3
     for attempt in range(max_retries):
+        if cancel_event is not None and cancel_event.is_set():
+            return CANCELLED_RESPONSE, []
         try:
-            print("... Sending request to AI model...")
+            if not quiet:
+                print("... Sending request to AI model...")
             # Adding verify=False to bypass potential Colab/local SSL issues
             requests.packages.urllib3.disable_warnings(requests.packages.urllib3.exceptions.InsecureRequestWarning)
-            response = requests.post(url, headers=headers, data=json.dumps(payload), verify=False)
+            response = requests.post(url, headers=headers, data=json.dumps(payload), verify=False, timeout=REQUEST_TIMEOUT)
             response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
 
             result = response.json()
+            _record_usage(feature, result.get('usageMetadata', {}), estimated_tokens, downgraded)
             candidate = result.get('candidates', [{}])[0]
 
             if candidate and candidate.get('content') and candidate['content'].get('parts'):
@@ -108,8 +410,12 @@ def _call_gemini_api(payload, is_grounded=False, image_data_base64=None):
             if response.status_code == 429 and attempt < max_retries - 1:
                 # Handle rate limiting (429) with exponential backoff
                 wait_time = 2 ** attempt
-                print(f"Rate limit hit (429). Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
+                if not quiet:
+                    print(f"Rate limit hit (429). Retrying in {wait_time} seconds...")
+                if cancel_event is not None:
+                    cancel_event.wait(wait_time) # Wakes up early if the request is cancelled
+                else:
+                    time.sleep(wait_time)
             else:
                 return f"HTTP Error: {e}", []
         except requests.exceptions.RequestException as e:
@@ -120,6 +426,175 @@ def _call_gemini_api(payload, is_grounded=False, image_data_base64=None):
     return "Error: Failed to get a response after multiple retries.", []
 
 
+# --- Response Cache & Speculative Prefetching ---
+
+# Successful responses are kept in memory for the rest of the session, keyed by the request payload.
+_response_cache = {}
+# Cache key -> prefetch job: {'future': Future, 'cancel': threading.Event, 'sent': bool}
+_inflight_requests = {}
+_cache_lock = threading.Lock()
+_prefetch_queue = None # Jobs for the daemon prefetch workers, created on first use
+_prefetch_reserved_tokens = 0 # Estimated tokens of prefetches sent but not yet recorded in the ledger
+CANCELLED_RESPONSE = "Error: Request cancelled."
+
+
+def _is_error_response(response_text: str) -> bool:
+    """Returns True if the text is one of the error strings produced by _call_gemini_api."""
+    return response_text.startswith(("Error", "HTTP Error", "Network Error"))
+
+
+def _cache_key(payload, is_grounded=False) -> str:
+    """Builds a stable cache key from the request payload."""
+    raw = json.dumps({"payload": payload, "grounded": is_grounded}, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _fetch_and_cache(key, payload, is_grounded=False, quiet=False, feature='general', cancel_event=None):
+    """Calls the API and stores successful responses in the response cache."""
+    response_text, sources = _call_gemini_api(payload, is_grounded=is_grounded, quiet=quiet, feature=feature, cancel_event=cancel_event)
+    if not _is_error_response(response_text):
+        with _cache_lock:
+            _response_cache[key] = (response_text, sources)
+    return response_text, sources
+
+
+def _call_gemini_api_cached(payload, is_grounded=False, feature='general'):
+    """Like _call_gemini_api, but reuses cached or already-prefetching responses for the same payload."""
+    key = _cache_key(payload, is_grounded)
+
+    with _cache_lock:
+        if key in _response_cache:
+            return _response_cache[key]
+        job = _inflight_requests.get(key)
+        if job is not None and not job['sent']:
+            # The prefetch hasn't sent anything yet: take over rather than wait out its delay.
+            job['cancel'].set()
+            job = None
+
+    if job is not None:
+        response = job['future'].result()
+        if response[0] != CANCELLED_RESPONSE:
+            return response
+
+    return _fetch_and_cache(key, payload, is_grounded, feature=feature)
+
+
+def _prefetch_worker():
+    """Runs queued prefetch jobs forever, reporting each result through its Future."""
+    while True:
+        future, fn, args = _prefetch_queue.get()
+        if not future.set_running_or_notify_cancel():
+            continue # Cancelled while still queued
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+
+def _submit_prefetch(fn, *args):
+    """Queues fn(*args) for the prefetch workers and returns a Future for its result.
+
+    The workers are daemon threads, which the interpreter doesn't join at exit, so quitting never
+    waits on a prefetch request that is still in flight. (ThreadPoolExecutor threads are always
+    joined at exit.) Call this while holding _cache_lock, which also guards the lazy start.
+    """
+    global _prefetch_queue
+    from concurrent.futures import Future
+    if _prefetch_queue is None:
+        import queue
+        _prefetch_queue = queue.Queue()
+        for i in range(PREFETCH_WORKERS):
+            threading.Thread(target=_prefetch_worker, name=f"prefetch-{i}", daemon=True).start()
+
+    future = Future()
+    _prefetch_queue.put((future, fn, args))
+    return future
+
+
+def _prefetch_within_budget(tokens: int) -> bool:
+    """Returns True if a speculative request of this size still fits in the share of the daily budget
+    prefetching may use, while leaving room for at least one real request of the same size.
+    """
+    if not DAILY_TOKEN_BUDGET:
+        return True
+    used_tokens = _tokens_used_today()
+    if used_tokens is None:
+        return False
+    return (used_tokens + tokens <= DAILY_TOKEN_BUDGET * PREFETCH_BUDGET_SHARE and
+            used_tokens + 2 * tokens <= DAILY_TOKEN_BUDGET)
+
+
+def _run_prefetch(key, job, payload, is_grounded, feature, delay):
+    """Prefetch worker: waits out the delay, then sends the request unless it was cancelled meanwhile."""
+    global _prefetch_reserved_tokens
+    if job['cancel'].wait(delay):
+        return CANCELLED_RESPONSE, []
+
+    estimated_tokens = _estimate_payload_tokens(payload)
+    with _cache_lock:
+        if job['cancel'].is_set():
+            return CANCELLED_RESPONSE, []
+        # Count prefetches still in flight too, so several can't pass the budget check at once
+        if not _prefetch_within_budget(_prefetch_reserved_tokens + estimated_tokens):
+            return CANCELLED_RESPONSE, []
+        _prefetch_reserved_tokens += estimated_tokens
+        job['sent'] = True
+
+    try:
+        return _fetch_and_cache(key, payload, is_grounded, quiet=True, feature=feature, cancel_event=job['cancel'])
+    finally:
+        with _cache_lock:
+            _prefetch_reserved_tokens -= estimated_tokens
+
+
+def _prefetch_api_call(payload, is_grounded=False, feature='general', delay=PREFETCH_DELAY):
+    """Starts a background request for the payload.
+
+    Returns a handle for _cancel_prefetches, or None if the response is already cached or
+    the daily budget is too close to its limit for speculative work.
+    """
+    if not _prefetch_within_budget(_estimate_payload_tokens(payload)):
+        return None
+
+    key = _cache_key(payload, is_grounded)
+
+    with _cache_lock:
+        if key in _response_cache:
+            return None
+        if key in _inflight_requests:
+            return key
+        job = {'cancel': threading.Event(), 'sent': False}
+        job['future'] = _submit_prefetch(_run_prefetch, key, job, payload, is_grounded, feature, delay)
+        _inflight_requests[key] = job
+
+    def _forget(_):
+        with _cache_lock:
+            if _inflight_requests.get(key) is job:
+                del _inflight_requests[key]
+
+    job['future'].add_done_callback(_forget)
+    return key
+
+
+def _cancel_prefetches(handles):
+    """Cancels prefetches. Ones still waiting are never sent; one already sent finishes and is cached."""
+    with _cache_lock:
+        jobs = [_inflight_requests[handle] for handle in handles if handle in _inflight_requests]
+        for job in jobs:
+            job['cancel'].set()
+
+    # Future.cancel() runs _forget, which takes _cache_lock, so it must be called after releasing it
+    for job in jobs:
+        job['future'].cancel()
+
+
+def _shutdown_prefetching():
+    """Cancels all outstanding prefetches. Requests already in flight are abandoned with their daemon threads."""
+    with _cache_lock:
+        handles = list(_inflight_requests)
+    _cancel_prefetches(handles)
+
+
 # --- Document & Archive Extraction Helpers (omitted for brevity) ---
 
 def _extract_text_from_proprietary_docs(file_path: str) -> str:
@@ -233,18 +708,13 @@ def _extract_text_from_plain_and_pdf(file_path: str) -> str:
     except Exception as e:
         return f"An unknown error occurred while reading the file: {e}"
 
-def summarize_file():
-    """Reads a local file (many types) and asks the AI to summarize its contents."""
-    print("\n--- 4. Summarize Local File (Multi-format) ---") # Corrected menu number
-    filepath = input("Enter the path to the file you want to analyze (or type 'back'):\n> ").strip()
-    if filepath.lower() == 'back':
-        return
-
+def _summarize_path(filepath: str) -> tuple:
+    """Extracts content from a local file and asks the AI to summarize it. Returns (summary, error)."""
     if not os.path.exists(filepath):
-        print(f"Error: File not found at path: {filepath}")
-        return
+        return None, f"Error: File not found at path: {filepath}"
 
     ext = os.path.splitext(filepath)[1].lower()
+    _load_document_library(ext)
     file_content = ""
     image_base64 = None
 
@@ -257,34 +727,72 @@ def summarize_file():
     elif ext in ('.jpg', '.jpeg', '.png', '.webp'):
         image_base64, error = _get_image_base64(filepath)
         if error:
-            print(error)
-            return
+            return None, error
         file_content = "Describe and summarize this image content in a concise, bulleted list."
     else:
-        print(f"Error: Unsupported file type for direct analysis: {ext}. Returning to menu.")
-        return
+        return None, f"Error: Unsupported file type for direct analysis: {ext}."
 
     if file_content.startswith("Error") or file_content.startswith("Warning"):
-        print(file_content)
-        return
+        return None, file_content
 
-    if not image_base64:
-        print(f"Successfully extracted {len(file_content)} characters from '{filepath}'.")
-        # For text files, the prompt includes the content
-        prompt = f"Please provide a concise, bulleted summary of the following document content:\n\n---\n{file_content}\n---"
-    else:
+    if image_base64:
         # For images, the prompt is simple and the image is passed via Base64
-        prompt = file_content 
+        return _summarize_prompt(file_content, image_base64)
+
+    print(f"Successfully extracted {len(file_content)} characters from '{filepath}'.")
+    document_tokens = _estimate_tokens(file_content)
+
+    if document_tokens <= SUMMARY_CHUNK_TOKENS:
+        # For text files, the prompt includes the content
+        return _summarize_prompt(f"Please provide a concise, bulleted summary of the following document content:\n\n---\n{file_content}\n---")
+
+    # Too large for one request: summarize it in chunks, truncating first if it would need too many
+    max_document_tokens = SUMMARY_CHUNK_TOKENS * MAX_SUMMARY_CHUNKS
+    if document_tokens > max_document_tokens:
+        print(f"Warning: Document is ~{document_tokens} tokens; only the first ~{max_document_tokens} will be summarized.")
+        file_content = _truncate_to_tokens(file_content, max_document_tokens)
+
+    chunks = _split_into_chunks(file_content, SUMMARY_CHUNK_TOKENS, MAX_SUMMARY_CHUNKS)
+    print(f"Document is too large for one request; summarizing it in {len(chunks)} parts.")
+
+    partial_summaries = []
+    for i, chunk in enumerate(chunks):
+        summary, error = _summarize_prompt(f"Please provide a concise, bulleted summary of part {i + 1} of {len(chunks)} of a document:\n\n---\n{chunk}\n---")
+        if error:
+            return None, error
+        partial_summaries.append(f"Part {i + 1}:\n{summary}")
+
+    combined = "\n\n".join(partial_summaries)
+    return _summarize_prompt(f"The following are summaries of consecutive parts of one document. Combine them into a single concise, bulleted summary of the whole document:\n\n---\n{combined}\n---")
 
+
+def _summarize_prompt(prompt: str, image_base64=None) -> tuple:
+    """Sends one summarization request. Returns (summary, error)."""
     payload = {
         "contents": [{"parts": [{"text": prompt}]}],
     }
 
-    response_text, _ = _call_gemini_api(payload, image_data_base64=image_base64)
+    response_text, _ = _call_gemini_api(payload, image_data_base64=image_base64, feature='summarize')
+    if _is_error_response(response_text):
+        return None, response_text
+    return response_text, None
+
+
+def summarize_file():
+    """Reads a local file (many types) and asks the AI to summarize its contents."""
+    print("\n--- 4. Summarize Local File (Multi-format) ---") # Corrected menu number
+    filepath = input("Enter the path to the file you want to analyze (or type 'back'):\n> ").strip()
+    if filepath.lower() == 'back':
+        return
+
+    summary, error = _summarize_path(filepath)
+    if error:
+        print(error)
+        return
 
     print("\n" + "="*50)
     print(f"📄 Summary of {os.path.basename(filepath)}:")
-    print(response_text)
+    print(summary)
     print("="*50 + "\n")
 
 
@@ -310,22 +818,49 @@ def _save_recipes(recipes):
     except Exception as e:
         print(f"Error saving recipes: {e}")
 
-def _get_ai_suggested_tags(command: str) -> list:
-    """Uses Gemini to suggest tags for a given command string."""
+def _search_recipes(recipes, query: str) -> list:
+    """Returns the recipes whose name or tags contain the (lowercase) query."""
+    return [
+        r for r in recipes
+        if query in r['name'].lower() or
+           any(query in tag for tag in r['tags'])
+    ]
+
+def _new_recipe(name: str, command: str, tags: list) -> dict:
+    """Builds a recipe record ready to be appended to the vault."""
+    return {
+        'id': str(uuid4()),
+        'name': name,
+        'command': command,
+        'tags': tags,
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+def _recipe_name_from_description(description: str) -> str:
+    """Uses the description as the base name for an AI-generated recipe."""
+    return f"AI Generated: {description[:50]}..." if len(description) > 50 else description
+
+def _build_tags_payload(command: str) -> dict:
+    """Builds the request payload asking Gemini for tags for a command string."""
     prompt = (
         "Analyze the following Linux/CLI command. Provide exactly 5 relevant tags, separated by commas. "
         "Do NOT include any explanation, headers, or extra text, only the tags."
         f"Command: {command}"
     )
 
-    payload = {
+    return {
         "contents": [{"parts": [{"text": prompt}]}],
     }
 
+
+def _get_ai_suggested_tags(command: str) -> list:
+    """Uses Gemini to suggest tags for a given command string."""
+    payload = _build_tags_payload(command)
+
     print("... AI analyzing command to suggest tags...")
-    response_text, _ = _call_gemini_api(payload)
+    response_text, _ = _call_gemini_api_cached(payload, feature='recipe_tags')
 
-    if response_text.startswith("Error"):
+    if _is_error_response(response_text):
         print(f"Warning: AI tagging failed due to API error. Using no suggested tags.")
         return []
 
@@ -351,7 +886,7 @@ def _get_ai_generated_command(description: str) -> str:
     }
 
     print("... AI generating command...")
-    response_text, _ = _call_gemini_api(payload)
+    response_text, _ = _call_gemini_api(payload, feature='recipe_gen')
     
     if response_text.startswith("Error"):
         print(f"Error: AI command generation failed: {response_text}")
@@ -365,6 +900,44 @@ def _get_ai_generated_command(description: str) -> str:
 
 # --- AI Assistant Functions ---
 
+def _ask_with_grounding(query: str) -> tuple:
+    """Sends a question to Gemini with Google Search grounding. Returns (response_text, sources)."""
+    payload = {
+        "contents": [{"parts": [{"text": query}]}],
+        "tools": [{"google_search": {}}] # Enable Google Search for grounding
+    }
+
+    return _call_gemini_api(payload, is_grounded=True, feature='ask')
+
+
+def _explain_code(code_snippet: str) -> str:
+    """Asks Gemini to explain a code snippet."""
+    prompt = f"Explain the following code snippet thoroughly, focusing on its purpose, inputs, and outputs. Use clear, simple language:\n\n\n{code_snippet}\n"
+
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+    }
+
+    response_text, _ = _call_gemini_api(payload, feature='explain')
+    return response_text
+
+
+def _generate_code(request: str) -> str:
+    """Asks Gemini to generate code for a natural language request."""
+    # System instruction to encourage clean, runnable code wrapped in a Markdown block
+    system_prompt = "You are an expert software developer. Generate a complete, runnable code solution for the user's request. Always wrap the code in a single Markdown code block (language\\ncode\\n)."
+    
+    prompt = f"Generate code for the following request: {request}"
+
+    payload = {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "systemInstruction": {"parts": [{"text": system_prompt}]}
+    }
+
+    response_text, _ = _call_gemini_api(payload, feature='gen')
+    return response_text
+
+
 def chat_with_grounding():
     """General Q&A using the Gemini model with Google Search grounding."""
     print("\n--- 1. General AI Chat (Web Search) ---")
@@ -372,12 +945,7 @@ def chat_with_grounding():
     if query.lower() == 'back':
         return
 
-    payload = {
-        "contents": [{"parts": [{"text": query}]}],
-        "tools": [{"google_search": {}}] # Enable Google Search for grounding
-    }
-    
-    response_text, sources = _call_gemini_api(payload, is_grounded=True)
+    response_text, sources = _ask_with_grounding(query)
     
     print("\n" + "="*50)
     print("🤖 AI Response:")
@@ -407,14 +975,8 @@ def code_explainer():
     if not code_snippet.strip():
         print("No code provided. Returning to main menu.")
         return
-        
-    prompt = f"Explain the following code snippet thoroughly, focusing on its purpose, inputs, and outputs. Use clear, simple language:\n\n\n{code_snippet}\n"
 
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-    }
-
-    response_text, _ = _call_gemini_api(payload)
+    response_text = _explain_code(code_snippet)
     
     print("\n" + "="*50)
     print("🧠 Code Analysis:")
@@ -429,17 +991,7 @@ def code_generator():
     if not request:
         return
 
-    # System instruction to encourage clean, runnable code wrapped in a Markdown block
-    system_prompt = "You are an expert software developer. Generate a complete, runnable code solution for the user's request. Always wrap the code in a single Markdown code block (language\\ncode\\n)."
-    
-    prompt = f"Generate code for the following request: {request}"
-
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "systemInstruction": {"parts": [{"text": system_prompt}]}
-    }
-
-    response_text, _ = _call_gemini_api(payload)
+    response_text = _generate_code(request)
     
     print("\n" + "="*50)
     print("💡 Generated Code:")
@@ -465,8 +1017,7 @@ def suggest_new_command_recipe():
         print("Failed to generate a valid command. Please try a different description.")
         return
 
-    # Use the description as the base name for the recipe
-    name = f"AI Generated: {description[:50]}..." if len(description) > 50 else description
+    name = _recipe_name_from_description(description)
 
     print("\n" + "="*50)
     print("🤖 AI Suggestion:")
@@ -491,13 +1042,7 @@ def suggest_new_command_recipe():
 
         recipes = _load_recipes()
         
-        new_recipe = {
-            'id': str(uuid4()),
-            'name': name,
-            'command': command,
-            'tags': final_tags,
-            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-        }
+        new_recipe = _new_recipe(name, command, final_tags)
 
         recipes.append(new_recipe)
         _save_recipes(recipes)
@@ -514,37 +1059,35 @@ def add_known_command_recipe():
         print("Recipe name cannot be empty.")
         return
 
+    # Check the name first (it's local) so a duplicate never costs an AI tagging request.
+    recipes = _load_recipes()
+
+    if any(r['name'].lower() == name.lower() for r in recipes):
+        print(f"Error: Recipe named '{name}' already exists. Use a unique name.")
+        return
+
     command = input("Paste the full command string (e.g., 'grep -r --include=*.py \"import\" .'):\n> ").strip()
     if not command:
         print("Command cannot be empty.")
         return
 
-    recipes = _load_recipes()
+    # Start AI tagging in the background and ask for the user's own tags while it runs;
+    # _get_ai_suggested_tags then picks up the finished result.
+    _prefetch_api_call(_build_tags_payload(command), feature='recipe_tags', delay=0)
 
-    if any(r['name'].lower() == name.lower() for r in recipes):
-        print(f"Error: Recipe named '{name}' already exists. Use a unique name.")
-        return
+    print("\n--- Tagging ---")
+    tags_input = input("Enter your own comma-separated tags (AI suggestions will be added; press Enter to skip):\n> ").strip()
+    user_tags = [t.strip().lower() for t in tags_input.split(',') if t.strip()]
 
     suggested_tags = _get_ai_suggested_tags(command)
-    
-    print("\n--- Tagging ---")
     if suggested_tags:
         print(f"💡 AI Suggested Tags: {', '.join(suggested_tags)}")
-        tags_input = input("Enter additional comma-separated tags (or press Enter to use AI's suggestions):\n> ").strip()
     else:
-        tags_input = input("Enter comma-separated tags (AI suggestion failed):\n> ").strip()
+        print("AI tag suggestion failed; using your tags only.")
 
-    user_tags = [t.strip().lower() for t in tags_input.split(',') if t.strip()]
     final_tags = list(set(suggested_tags + user_tags))
 
-
-    new_recipe = {
-        'id': str(uuid4()),
-        'name': name,
-        'command': command,
-        'tags': final_tags,
-        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-    }
+    new_recipe = _new_recipe(name, command, final_tags)
 
     recipes.append(new_recipe)
     _save_recipes(recipes)
@@ -561,11 +1104,7 @@ def search_and_copy_recipe():
 
     query = input("Enter a keyword or tag to search:\n> ").strip().lower()
 
-    results = [
-        r for r in recipes
-        if query in r['name'].lower() or
-           any(query in tag for tag in r['tags'])
-    ]
+    results = _search_recipes(recipes, query)
 
     if not results:
         print(f"No recipes found matching '{query}'.")
@@ -597,6 +1136,15 @@ def search_and_copy_recipe():
         print("Invalid input. Please enter a number.")
 
 
+def _build_recipe_explanation_payload(command: str) -> dict:
+    """Builds the request payload asking Gemini to explain a recipe command."""
+    prompt = f"Act as a Linux/DevOps tutor. Explain the following command line recipe step-by-step. Focus on what each flag and argument does, and provide a clear, easy-to-understand purpose for the entire command. The command is:\n\n`{command}`"
+
+    return {
+        "contents": [{"parts": [{"text": prompt}]}],
+    }
+
+
 def explain_command_recipe():
     """Searches for a command recipe and asks the AI to explain it."""
     recipes = _load_recipes()
@@ -607,11 +1155,7 @@ def explain_command_recipe():
     print("\n--- 8. Explain Recipe (AI) ---") # Corrected menu number
     query = input("Enter keyword or tag to find the recipe you want explained:\n> ").strip().lower()
 
-    results = [
-        r for r in recipes
-        if query in r['name'].lower() or
-           any(query in tag for tag in r['tags'])
-    ]
+    results = _search_recipes(recipes, query)
 
     if not results:
         print(f"No recipes found matching '{query}'.")
@@ -621,6 +1165,12 @@ def explain_command_recipe():
     for i, r in enumerate(results):
         print(f"{i+1}. Name: {r['name']} | Command: {r['command'][:50]}...")
 
+    # Explanations for the top results are fetched while the user is still choosing.
+    prefetches = [
+        _prefetch_api_call(_build_recipe_explanation_payload(r['command']), feature='recipe_explain')
+        for r in results[:PREFETCH_TOP_N]
+    ]
+
     try:
         selection = int(input("Enter the number of the recipe to EXPLAIN (or type 0 to cancel):\n> ")) - 1
         if selection < 0 or selection >= len(results):
@@ -630,13 +1180,11 @@ def explain_command_recipe():
         selected_recipe = results[selection]
         command_to_explain = selected_recipe['command']
 
-        prompt = f"Act as a Linux/DevOps tutor. Explain the following command line recipe step-by-step. Focus on what each flag and argument does, and provide a clear, easy-to-understand purpose for the entire command. The command is:\n\n`{command_to_explain}`"
-
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-        }
+        # Drop the prefetches for the recipes that weren't picked.
+        _cancel_prefetches(h for i, h in enumerate(prefetches) if i != selection)
 
-        response_text, _ = _call_gemini_api(payload)
+        payload = _build_recipe_explanation_payload(command_to_explain)
+        response_text, _ = _call_gemini_api_cached(payload, feature='recipe_explain')
 
         print("\n" + "="*50)
         print(f"🧠 AI Explanation for: {selected_recipe['name']}")
@@ -647,6 +1195,258 @@ def explain_command_recipe():
 
     except ValueError:
         print("Invalid input. Please enter a number.")
+    finally:
+        _cancel_prefetches(prefetches)
+
+
+# --- Command-Line Subcommands ---
+# Each handler returns (data, text): data is the JSON-serializable result and text its plain
+# rendering. On failure data is None and text holds the error message.
+
+def _read_input_text(words) -> str:
+    """Joins positional words into one string, reading stdin instead when none (or '-') are given."""
+    if words and words != ['-']:
+        return " ".join(words).strip()
+    return sys.stdin.read().strip()
+
+
+def _parse_tags(tags_input) -> list:
+    """Splits a comma-separated tag string into cleaned, lowercase tags."""
+    if not tags_input:
+        return []
+    return [t.strip().lower() for t in tags_input.split(',') if t.strip()]
+
+
+def _cmd_ask(args):
+    query = _read_input_text(args.question)
+    if not query:
+        return None, "Error: No question provided."
+
+    response_text, sources = _ask_with_grounding(query)
+    if _is_error_response(response_text):
+        return None, response_text
+
+    text = response_text
+    if sources:
+        text += "\n\nSources:\n" + "\n".join(sources)
+    return {"question": query, "answer": response_text, "sources": sources}, text
+
+
+def _cmd_explain(args):
+    if args.file not in (None, '-'):
+        if not os.path.exists(args.file):
+            return None, f"Error: File not found at path: {args.file}"
+        if os.path.splitext(args.file)[1].lower() == '.pdf':
+            _load_document_library('.pdf')
+        code_snippet = _extract_text_from_plain_and_pdf(args.file)
+        if code_snippet.startswith(("Error", "Warning", "An unknown error")):
+            return None, code_snippet
+    else:
+        code_snippet = sys.stdin.read()
+
+    if not code_snippet.strip():
+        return None, "Error: No code provided."
+
+    response_text = _explain_code(code_snippet)
+    if _is_error_response(response_text):
+        return None, response_text
+    return {"explanation": response_text}, response_text
+
+
+def _cmd_gen(args):
+    request = _read_input_text(args.description)
+    if not request:
+        return None, "Error: No description provided."
+
+    response_text = _generate_code(request)
+    if _is_error_response(response_text):
+        return None, response_text
+    return {"request": request, "code": response_text}, response_text
+
+
+def _cmd_summarize(args):
+    summary, error = _summarize_path(args.path)
+    if error:
+        return None, error
+    return {"file": args.path, "summary": summary}, summary
+
+
+def _cmd_recipe_search(args):
+    results = _search_recipes(_load_recipes(), args.query.strip().lower())
+    # One recipe per line, tab-separated, so the plain output is easy to cut/awk.
+    text = "\n".join(f"{r['name']}\t{','.join(r['tags'])}\t{r['command']}" for r in results)
+    return results, text
+
+
+def _cmd_recipe_add(args):
+    name = args.name.strip()
+    # REMAINDER keeps a leading '--' separator as part of the command, so drop it here
+    command_words = args.command[1:] if args.command[:1] == ['--'] else args.command
+    command = _read_input_text(command_words)
+    if not name or not command:
+        return None, "Error: Both a recipe name and a command are required."
+
+    recipes = _load_recipes()
+    if any(r['name'].lower() == name.lower() for r in recipes):
+        return None, f"Error: Recipe named '{name}' already exists. Use a unique name."
+
+    suggested_tags = [] if args.no_ai_tags else _get_ai_suggested_tags(command)
+    new_recipe = _new_recipe(name, command, list(set(suggested_tags + _parse_tags(args.tags))))
+
+    recipes.append(new_recipe)
+    _save_recipes(recipes)
+    return new_recipe, f"Successfully added recipe '{name}' with {len(new_recipe['tags'])} tags."
+
+
+def _cmd_recipe_gen(args):
+    description = _read_input_text(args.description)
+    if not description:
+        return None, "Error: No description provided."
+
+    command = _get_ai_generated_command(description)
+    if not command:
+        return None, "Error: Failed to generate a valid command."
+
+    name = _recipe_name_from_description(description)
+    if not args.save:
+        return {"name": name, "command": command, "saved": False}, command
+
+    suggested_tags = [] if args.no_ai_tags else _get_ai_suggested_tags(command)
+    new_recipe = _new_recipe(name, command, list(set(suggested_tags + _parse_tags(args.tags))))
+
+    recipes = _load_recipes()
+    recipes.append(new_recipe)
+    _save_recipes(recipes)
+    return dict(new_recipe, saved=True), command
+
+
+def _cmd_recipe_explain(args):
+    query = args.query.strip().lower()
+    results = _search_recipes(_load_recipes(), query)
+    if not results:
+        return None, f"Error: No recipes found matching '{query}'."
+    if not 1 <= args.index <= len(results):
+        return None, f"Error: --index must be between 1 and {len(results)}."
+
+    selected_recipe = results[args.index - 1]
+    payload = _build_recipe_explanation_payload(selected_recipe['command'])
+    response_text, _ = _call_gemini_api_cached(payload, feature='recipe_explain')
+    if _is_error_response(response_text):
+        return None, response_text
+
+    data = {"name": selected_recipe['name'], "command": selected_recipe['command'], "explanation": response_text}
+    return data, response_text
+
+
+def _cmd_usage(args):
+    day = args.date or time.strftime('%Y-%m-%d')
+    with _usage_ledger_lock() as locked:
+        ledger = _load_usage_ledger() if locked else None
+    if ledger is None:
+        return None, f"Error: Token usage ledger {TOKEN_USAGE_FILE} is unreadable."
+    features = ledger.get(day, {})
+    total_tokens = sum(entry['total_tokens'] for entry in features.values())
+    total_cost = sum(entry['cost_usd'] for entry in features.values())
+
+    lines = [
+        f"{feature}\t{entry['requests']} requests\t{entry['total_tokens']} tokens\t~${entry['cost_usd']:.4f}"
+        for feature, entry in sorted(features.items())
+    ]
+    lines.append(f"total\t{total_tokens} tokens\t~${total_cost:.4f}")
+    if DAILY_TOKEN_BUDGET:
+        lines.append(f"budget\t{DAILY_TOKEN_BUDGET} tokens/day ({BUDGET_MODE})\t{max(DAILY_TOKEN_BUDGET - total_tokens, 0)} remaining")
+
+    data = {
+        "date": day,
+        "features": features,
+        "total_tokens": total_tokens,
+        "cost_usd": round(total_cost, 6),
+        "daily_budget": DAILY_TOKEN_BUDGET or None,
+        "budget_mode": BUDGET_MODE,
+    }
+    return data, "\n".join(lines)
+
+
+def _build_arg_parser():
+    """Builds the argparse parser for the scriptable subcommands."""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--json', action='store_true', help="emit JSON instead of plain text")
+
+    parser = argparse.ArgumentParser(
+        prog='ai_assistant_cli.py',
+        description="AI Assistant & Command Recipe CLI. Run without arguments for the interactive menu.",
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ask = subparsers.add_parser('ask', parents=[common], help="ask a question (Google Search grounded)")
+    ask.add_argument('question', nargs='*', help="the question; read from stdin if omitted")
+    ask.set_defaults(handler=_cmd_ask)
+
+    explain = subparsers.add_parser('explain', parents=[common], help="explain a code snippet")
+    explain.add_argument('file', nargs='?', help="file containing the code; read from stdin if omitted or '-'")
+    explain.set_defaults(handler=_cmd_explain)
+
+    gen = subparsers.add_parser('gen', parents=[common], help="generate code from a description")
+    gen.add_argument('description', nargs='*', help="what to generate; read from stdin if omitted")
+    gen.set_defaults(handler=_cmd_gen)
+
+    summarize = subparsers.add_parser('summarize', parents=[common], help="summarize a local file")
+    summarize.add_argument('path', help="path of the file to summarize")
+    summarize.set_defaults(handler=_cmd_summarize)
+
+    recipe = subparsers.add_parser('recipe', help="manage the command recipe vault")
+    recipe_commands = recipe.add_subparsers(dest='recipe_command', required=True)
+
+    search = recipe_commands.add_parser('search', parents=[common], help="search recipes by name or tag")
+    search.add_argument('query', nargs='?', default='', help="keyword or tag (omit to list all recipes)")
+    search.set_defaults(handler=_cmd_recipe_search)
+
+    add = recipe_commands.add_parser(
+        'add', parents=[common], help="save a command you already know",
+        epilog="Options must come before the command: everything after the first word of the command "
+               "(including things like --json) is saved as part of it.",
+    )
+    add.add_argument('--name', required=True, help="unique recipe name")
+    add.add_argument('--tags', help="comma-separated tags")
+    add.add_argument('--no-ai-tags', action='store_true', help="don't ask the AI for tag suggestions")
+    # REMAINDER keeps flags in the command (e.g. 'ls -la') from being parsed as our own options
+    add.add_argument('command', nargs=argparse.REMAINDER, help="the command string, after all options; read from stdin if omitted")
+    add.set_defaults(handler=_cmd_recipe_add)
+
+    recipe_gen = recipe_commands.add_parser('gen', parents=[common], help="generate a command with AI")
+    recipe_gen.add_argument('--save', action='store_true', help="save the generated command to the vault")
+    recipe_gen.add_argument('--tags', help="comma-separated tags (with --save)")
+    recipe_gen.add_argument('--no-ai-tags', action='store_true', help="don't ask the AI for tag suggestions")
+    recipe_gen.add_argument('description', nargs='*', help="task description; read from stdin if omitted")
+    recipe_gen.set_defaults(handler=_cmd_recipe_gen)
+
+    recipe_explain = recipe_commands.add_parser('explain', parents=[common], help="explain a saved recipe with AI")
+    recipe_explain.add_argument('query', help="keyword or tag to find the recipe")
+    recipe_explain.add_argument('--index', type=int, default=1, help="which match to explain (default: 1)")
+    recipe_explain.set_defaults(handler=_cmd_recipe_explain)
+
+    usage = subparsers.add_parser('usage', parents=[common], help="show recorded token usage and cost")
+    usage.add_argument('--date', help="day to show as YYYY-MM-DD (default: today)")
+    usage.set_defaults(handler=_cmd_usage)
+
+    return parser
+
+
+def _run_subcommand(args) -> int:
+    """Runs a parsed subcommand and prints its result. Returns the process exit code."""
+    # Progress messages go to stderr so stdout only carries the result and stays pipe-friendly.
+    with contextlib.redirect_stdout(sys.stderr):
+        data, text = args.handler(args)
+
+    if data is None:
+        print(text, file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(data, indent=2, ensure_ascii=False))
+    elif text:
+        print(text)
+    return 0
 
 
 # --- Main Menu and Execution ---
@@ -698,5 +1498,16 @@ def main_menu():
         else:
             print("Invalid choice. Please enter a number between 1 and 9.")
 
+def main(argv=None) -> int:
+    """Runs a subcommand when arguments are given, otherwise starts the interactive menu."""
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        if not argv:
+            main_menu()
+            return 0
+        return _run_subcommand(_build_arg_parser().parse_args(argv))
+    finally:
+        _shutdown_prefetching()
+
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file